@@ -20,3 +20,10 @@ if __name__ == '__main__':
     print('First SNP:', first_snp, first_snp.dtype)
     # Print the first 3 SNPs
     print('First 3 SNPs:', bed[:3])
+    # Print the SNPs 2 and 0 (in that order)
+    print('SNPs 2 and 0:', bed[[2, 0]])
+    # Iterate over all the SNPs in a single sequential pass
+    for snp in bed:
+        print('SNP:', snp)
+    # Print the first SNP without decoding it (4 genotypes per byte)
+    print('First SNP packed:', bed.read_packed(0))
@@ -1,4 +1,5 @@
-from setuptools import setup, find_packages
+import os
+from setuptools import setup, find_packages, Extension
 
 __version__ = "1.0.1"
 __author__ = 'Rapsssito'
@@ -14,13 +15,18 @@ if __name__ == '__main__':
         init_content = fd.read()
     version = __version__
     author = __author__
+    # The optional C decoder is only built on request, so the published wheel stays pure Python
+    ext_modules = []
+    if os.environ.get('PLINK_BED_READER_C_EXT') == '1':
+        # The package falls back to pure Python if it cannot be built
+        ext_modules.append(Extension('plink_bed_reader._plink_decode', ['src/plink_bed_reader/_plink_decode.c'], optional=True))
 
     setup(
         name='plink-bed-reader',
         version=version,
         author=author,
         author_email='contact@rodrigomartin.dev',
-        description='Lightweight and memory efficient reader for PLINK BED files. It supports both SNP-major and individual-major formats. Written in pure Python.',
+        description='Lightweight and memory efficient reader for PLINK BED files. It supports both SNP-major and individual-major formats. Written in pure Python, with an optional C extension to decode the genotypes.',
         keywords='bed plink genetics bioinformatics variant indel snv genotype',
         long_description=long_description,
         long_description_content_type='text/markdown',
@@ -35,9 +41,12 @@ if __name__ == '__main__':
         ],
         package_dir={'': 'src'},
         packages=find_packages(where="src"),
+        ext_modules=ext_modules,
         python_requires='>= 3.6',
         install_requires=requirements,
         extras_require={
             "docs": ["sphinx", "sphinx-rtd-theme", "myst_parser", "docutils>=0.18.0"],
+            "numba": ["numba"],
+            "uring": ["liburing"],
         }
     )
@@ -0,0 +1,138 @@
+// Copyright 2024 - Barcelona Supercomputing Center
+// Author: Rodrigo Martin
+// MIT License
+
+// Optional C extension to decode the 2 bit SNP/Sample of PLINK BED chunks into one byte each.
+// Uses AVX2 shuffles when the CPU supports them and a word lookup table otherwise.
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+#include <string.h>
+
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define PLINK_DECODE_X86
+#include <immintrin.h>
+#endif
+
+// The 4 decoded SNP/Sample of each byte (bytes in memory order)
+static uint8_t decode_table[256][4];
+
+static void build_decode_table(void)
+{
+    // Each byte stores 4 SNP/Sample as 2 bit pairs, starting from the least significant bits
+    // The bits of each pair are stored in reverse order
+    for (int byte = 0; byte < 256; byte++)
+    {
+        for (int i = 0; i < 4; i++)
+        {
+            int pair = (byte >> (2 * i)) & 3;
+            decode_table[byte][i] = (uint8_t)(((pair & 1) << 1) | (pair >> 1));
+        }
+    }
+}
+
+static void decode_scalar(const uint8_t *src, uint8_t *dst, Py_ssize_t size)
+{
+    for (Py_ssize_t i = 0; i < size; i++)
+    {
+        memcpy(dst + 4 * i, decode_table[src[i]], 4);
+    }
+}
+
+#ifdef PLINK_DECODE_X86
+__attribute__((target("avx2"))) static Py_ssize_t decode_avx2(const uint8_t *src, uint8_t *dst, Py_ssize_t size)
+{
+    // Decoded value of the first and second pair of each nibble
+    const __m256i low_pair = _mm256_setr_epi8(0, 2, 1, 3, 0, 2, 1, 3, 0, 2, 1, 3, 0, 2, 1, 3,
+                                              0, 2, 1, 3, 0, 2, 1, 3, 0, 2, 1, 3, 0, 2, 1, 3);
+    const __m256i high_pair = _mm256_setr_epi8(0, 0, 0, 0, 2, 2, 2, 2, 1, 1, 1, 1, 3, 3, 3, 3,
+                                               0, 0, 0, 0, 2, 2, 2, 2, 1, 1, 1, 1, 3, 3, 3, 3);
+    const __m256i nibble_mask = _mm256_set1_epi8(0x0F);
+    Py_ssize_t i = 0;
+    // Decode 32 bytes (128 SNP/Sample) per iteration
+    for (; i + 32 <= size; i += 32)
+    {
+        __m256i bytes = _mm256_loadu_si256((const __m256i *)(src + i));
+        __m256i low = _mm256_and_si256(bytes, nibble_mask);
+        __m256i high = _mm256_and_si256(_mm256_srli_epi16(bytes, 4), nibble_mask);
+        __m256i first = _mm256_shuffle_epi8(low_pair, low);
+        __m256i second = _mm256_shuffle_epi8(high_pair, low);
+        __m256i third = _mm256_shuffle_epi8(low_pair, high);
+        __m256i fourth = _mm256_shuffle_epi8(high_pair, high);
+        // Interleave the 4 SNP/Sample of each byte (within each 128 bit lane)
+        __m256i first_second_low = _mm256_unpacklo_epi8(first, second);
+        __m256i first_second_high = _mm256_unpackhi_epi8(first, second);
+        __m256i third_fourth_low = _mm256_unpacklo_epi8(third, fourth);
+        __m256i third_fourth_high = _mm256_unpackhi_epi8(third, fourth);
+        __m256i out0 = _mm256_unpacklo_epi16(first_second_low, third_fourth_low);
+        __m256i out1 = _mm256_unpackhi_epi16(first_second_low, third_fourth_low);
+        __m256i out2 = _mm256_unpacklo_epi16(first_second_high, third_fourth_high);
+        __m256i out3 = _mm256_unpackhi_epi16(first_second_high, third_fourth_high);
+        // Restore the order across the 128 bit lanes
+        _mm256_storeu_si256((__m256i *)(dst + 4 * i), _mm256_permute2x128_si256(out0, out1, 0x20));
+        _mm256_storeu_si256((__m256i *)(dst + 4 * i + 32), _mm256_permute2x128_si256(out2, out3, 0x20));
+        _mm256_storeu_si256((__m256i *)(dst + 4 * i + 64), _mm256_permute2x128_si256(out0, out1, 0x31));
+        _mm256_storeu_si256((__m256i *)(dst + 4 * i + 96), _mm256_permute2x128_si256(out2, out3, 0x31));
+    }
+    return i;
+}
+#endif
+
+static int has_avx2 = 0;
+
+static PyObject *decode(PyObject *self, PyObject *args)
+{
+    Py_buffer src;
+    Py_buffer dst;
+    if (!PyArg_ParseTuple(args, "y*w*", &src, &dst))
+    {
+        return NULL;
+    }
+    if (dst.len < 4 * src.len)
+    {
+        PyBuffer_Release(&src);
+        PyBuffer_Release(&dst);
+        PyErr_SetString(PyExc_ValueError, "Output buffer is too small");
+        return NULL;
+    }
+    const uint8_t *src_bytes = (const uint8_t *)src.buf;
+    uint8_t *dst_bytes = (uint8_t *)dst.buf;
+    Py_ssize_t done = 0;
+    Py_BEGIN_ALLOW_THREADS
+#ifdef PLINK_DECODE_X86
+    if (has_avx2)
+    {
+        done = decode_avx2(src_bytes, dst_bytes, src.len);
+    }
+#endif
+    // Decode the remaining bytes
+    decode_scalar(src_bytes + done, dst_bytes + 4 * done, src.len - done);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&src);
+    PyBuffer_Release(&dst);
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef plink_decode_methods[] = {
+    {"decode", decode, METH_VARARGS, "Decode the 2 bit SNP/Sample of the source buffer into one byte each in the output buffer."},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef plink_decode_module = {
+    PyModuleDef_HEAD_INIT,
+    "_plink_decode",
+    "Decoder of PLINK BED chunks",
+    -1,
+    plink_decode_methods,
+};
+
+PyMODINIT_FUNC PyInit__plink_decode(void)
+{
+    build_decode_table();
+#ifdef PLINK_DECODE_X86
+    __builtin_cpu_init();
+    has_avx2 = __builtin_cpu_supports("avx2");
+#endif
+    return PyModule_Create(&plink_decode_module);
+}
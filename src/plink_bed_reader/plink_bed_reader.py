@@ -2,11 +2,38 @@
 # Author: Rodrigo Martin
 # MIT License
 
-from typing import Tuple, Optional, Any, Union
+from typing import Tuple, Optional, Any, Union, List, Iterator, Sequence
 from enum import Enum, auto
 import os
-import io
+import mmap
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+try:
+    from . import _plink_decode
+except ImportError:
+    _plink_decode = None
+# Numba is only needed (and imported) if the C extension is not available
+njit = None
+if _plink_decode is None:
+    try:
+        from numba import njit, prange, get_num_threads
+    except ImportError:
+        njit = None
+try:
+    import liburing
+except ImportError:
+    liburing = None
+
+# Number of entries of the io_uring submission queue
+_URING_DEPTH = 64
+# Minimum chunk size to prefetch the next chunk in a background thread for strided slices
+_PREFETCH_MIN_BYTES = 1 << 16
+# Approximate number of bytes of the BED file decoded at once while iterating
+_ITER_BLOCK_BYTES = 1 << 20
+# Number of bytes counted at once by count_per_code (np.bincount casts them to intp)
+_COUNT_BLOCK_BYTES = 1 << 14
+# Minimum number of bytes of a multi-row decode to split it across the Numba threads
+_PARALLEL_MIN_BYTES = 1 << 20
 
 
 class BEDMode(Enum):
@@ -15,14 +42,9 @@ class BEDMode(Enum):
     INDIVIDUAL_MAJOR = auto()
 
 
-def _get_major_mode(bed_file: io.BufferedReader) -> BEDMode:
-    # Save byte position
-    pos = bed_file.tell()
+def _get_major_mode(bed_mmap: mmap.mmap) -> BEDMode:
     # Read the mode byte to check if the file is in SNP major or individual major mode
-    bed_file.seek(2, os.SEEK_SET)
-    mode = bed_file.read(1)
-    # Restore byte position
-    bed_file.seek(pos, os.SEEK_SET)
+    mode = bed_mmap[2:3]
     if mode == b'\x01':
         return BEDMode.SNP_MAJOR
     if mode == b'\x00':
@@ -30,17 +52,87 @@ def _get_major_mode(bed_file: io.BufferedReader) -> BEDMode:
     raise ValueError("Invalid mode byte")
 
 
+def _count_lines(file_path: str) -> int:
+    line_count = 0
+    last_chunk = b''
+    # Count the newlines in big binary chunks instead of iterating over the decoded lines
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            line_count += chunk.count(b'\n')
+            last_chunk = chunk
+    # The last line might not end with a newline
+    if last_chunk and not last_chunk.endswith(b'\n'):
+        line_count += 1
+    return line_count
+
+
 def _read_sample_snp_counts(fam_file_path: str, bim_file_path: str) -> Tuple[int, int]:
-    sample_count = 0
-    snp_count = 0
     # Count the number of samples and SNPs in the file
-    with open(fam_file_path, encoding='UTF-8') as fam_file:
-        for _ in fam_file:
-            sample_count += 1
-    with open(bim_file_path, encoding='UTF-8') as bim_file:
-        for _ in bim_file:
-            snp_count += 1
-    return sample_count, snp_count
+    return _count_lines(fam_file_path), _count_lines(bim_file_path)
+
+
+def _build_decode_lut() -> np.ndarray[Any, np.dtype[np.uint8]]:
+    # Each byte stores 4 SNP/Sample as 2 bit pairs, starting from the least significant bits
+    # The bits of each pair are stored in reverse order
+    # 0 = homozygous 1/1 (usually minor)
+    # 1 = heterozygous
+    # 2 = missing
+    # 3 = homozygous 2/2 (usually major)
+    # Align the table to a cache line (64 bytes), the whole table takes 16 cache lines
+    buffer = np.empty(256 * 4 + 63, dtype=np.uint8)
+    start = -buffer.ctypes.data % 64
+    lut = buffer[start:start + 256 * 4].reshape(256, 4)
+    for byte in range(256):
+        for i in range(4):
+            pair = (byte >> (2 * i)) & 3
+            lut[byte, i] = ((pair & 1) << 1) | (pair >> 1)
+    return lut
+
+
+def _build_swap_pairs_lut() -> np.ndarray[Any, np.dtype[np.uint8]]:
+    # Same byte with the bits of each pair swapped, so each pair holds the decoded SNP/Sample
+    lut = _build_decode_lut().astype(np.uint16)
+    return (lut[:, 0] | (lut[:, 1] << 2) | (lut[:, 2] << 4) | (lut[:, 3] << 6)).astype(np.uint8)
+
+
+def _build_code_counts_lut() -> np.ndarray[Any, np.dtype[np.int64]]:
+    # Number of SNP/Sample of each code (columns) in each byte (rows)
+    lut = _build_decode_lut()
+    return np.stack([(lut == code).sum(axis=1) for code in range(4)], axis=1).astype(np.int64)
+
+
+if njit is not None:
+    # The 4 decoded SNP/Sample of each byte as a single word (bytes in memory order)
+    _DECODE_WORDS = _build_decode_lut().view(np.uint32).reshape(256).astype(np.uint64)
+
+    @njit(cache=True, boundscheck=False)
+    def _decode_chunk(chunk, out, words):
+        # Decode 8 bytes (32 SNP/Sample) per iteration, storing 64 bit words (little endian)
+        blocks = chunk.size >> 3
+        out64 = out[:blocks << 5].view(np.uint64)
+        for block in range(blocks):
+            i = block << 3
+            j = block << 2
+            out64[j] = words[chunk[i]] | (words[chunk[i + 1]] << 32)
+            out64[j + 1] = words[chunk[i + 2]] | (words[chunk[i + 3]] << 32)
+            out64[j + 2] = words[chunk[i + 4]] | (words[chunk[i + 5]] << 32)
+            out64[j + 3] = words[chunk[i + 6]] | (words[chunk[i + 7]] << 32)
+        # Decode the remaining bytes one at a time
+        out32 = out.view(np.uint32)
+        for i in range(blocks << 3, chunk.size):
+            out32[i] = words[chunk[i]]
+
+    @njit(parallel=True, cache=True, boundscheck=False)
+    def _decode_chunk_parallel(chunk, out, words, parts):
+        # Split the chunk in parts of whole 8 byte blocks and decode each part in a different thread
+        part_size = (((chunk.size + parts - 1) // parts) + 7) & ~7
+        for part in prange(parts):
+            start = min(part * part_size, chunk.size)
+            stop = min(start + part_size, chunk.size)
+            _decode_chunk(chunk[start:stop], out[4 * start:4 * stop], words)
+else:
+    _decode_chunk = None
+    _decode_chunk_parallel = None
 
 
 class PLINKBEDReader():
@@ -52,9 +144,17 @@ class PLINKBEDReader():
     1 = heterozygous
     2 = missing
     3 = homozygous 2/2 (usually major)
+    A reader must not be shared between threads, open one reader per thread instead.
     """
 
-    def __init__(self, bed_file_path: str, offset: int = 0, count: Optional[int] = None, mode: Optional[BEDMode] = None, fam_file_path: Optional[str] = None, bim_file_path: Optional[str] = None):
+    # Lookup table to decode a byte into its 4 SNP/Sample, shared by all the readers
+    _LUT = _build_decode_lut()
+    # Lookup table to swap the bits of each pair of a byte
+    _SWAP_PAIRS_LUT = _build_swap_pairs_lut()
+    # Lookup table with the number of SNP/Sample of each code (columns) in a byte
+    _CODE_COUNTS_LUT = _build_code_counts_lut()
+
+    def __init__(self, bed_file_path: str, offset: int = 0, count: Optional[int] = None, mode: Optional[BEDMode] = None, fam_file_path: Optional[str] = None, bim_file_path: Optional[str] = None, use_uring: bool = False):
         """
         Parameters
         ----------
@@ -70,16 +170,25 @@ class PLINKBEDReader():
             Path to the FAM file. If not provided, it will be inferred from the BED file.
         bim_file_path : str, optional
             Path to the BIM file. If not provided, it will be inferred from the BED file.
+        use_uring : bool, optional
+            Read slices with batched io_uring submissions (Linux only, requires the liburing package).
         """
         bed_prefix = bed_file_path[:-4] if bed_file_path.endswith('.bed') else bed_file_path
         fam_file_path = bed_prefix + '.fam' if fam_file_path is None else fam_file_path
         bim_file_path = bed_prefix + '.bim' if bim_file_path is None else bim_file_path
         # Count the number of samples and SNPs in the file
         raw_sample_count, raw_snp_count = _read_sample_snp_counts(fam_file_path, bim_file_path)
-        # Open the BED file
-        self._bed_file = open(bed_prefix + '.bed', 'rb')
+        # Open the BED file, unbuffered as all the reads go through the memory map (or io_uring)
+        self._bed_file = open(bed_prefix + '.bed', 'rb', buffering=0)
+        # Map the BED file in memory to access the chunks without copying them
+        self._bed_mmap = mmap.mmap(self._bed_file.fileno(), 0, access=mmap.ACCESS_READ)
         # Check if the file is in SNP major or individual major mode
-        self._major_mode = _get_major_mode(self._bed_file)
+        self._major_mode = _get_major_mode(self._bed_mmap)
+        # Single index reads are random access, disable the readahead if possible
+        if hasattr(mmap, 'MADV_RANDOM'):
+            self._bed_mmap.madvise(mmap.MADV_RANDOM)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self._bed_file.fileno(), 0, 0, os.POSIX_FADV_RANDOM)
         # Check if the mode is correct
         if mode is not None and mode != self._major_mode:
             raise ValueError(f'Mismatch mode {mode} for file {self._major_mode}')
@@ -89,13 +198,30 @@ class PLINKBEDReader():
             self._snp_count = raw_snp_count
             # We are in individual major mode, so each byte contains 4 SNPs
             # The chunk size is rounded up to the nearest byte
-            self.chunk_size_bytes = int(np.ceil(self._snp_count / 4))
+            self.chunk_size_bytes = (self._snp_count + 3) >> 2
         elif self._major_mode == BEDMode.SNP_MAJOR:
             self._sample_count = raw_sample_count
             self._snp_count = raw_snp_count - offset if count is None else count
             # We are in SNP major mode, so each byte contains 4 samples
             # The chunk size is rounded up to the nearest byte
-            self.chunk_size_bytes = int(np.ceil(self._sample_count / 4))
+            self.chunk_size_bytes = (self._sample_count + 3) >> 2
+        # Skip the header (first 3 bytes are magic numbers and mode) and the offset chunks
+        self._base_offset = 3 + self.chunk_size_bytes * self._offset
+        # Length of each decoded chunk without the extra bits
+        self._is_ind_major = self._major_mode is BEDMode.INDIVIDUAL_MAJOR
+        self._out_len = self._snp_count if self._is_ind_major else self._sample_count
+        # Setup the io_uring queues used for slice reads
+        self._uring = None
+        if use_uring:
+            if liburing is None:
+                raise ImportError("liburing is required to read with io_uring")
+            self._uring = liburing.Ring()
+            self._uring_cqe = liburing.Cqe()
+            # Reusable read buffers, one per entry of the submission queue
+            self._uring_buffers = [bytearray(self.chunk_size_bytes) for _ in range(_URING_DEPTH)]
+            liburing.io_uring_queue_init(_URING_DEPTH, self._uring)
+        # Background thread to prefetch chunks, created on first use
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
 
     @property
     def sample_count(self):
@@ -114,47 +240,313 @@ class PLINKBEDReader():
 
     def close(self):
         """Close the BED file"""
+        if self._uring is not None:
+            liburing.io_uring_queue_exit(self._uring)
+            self._uring = None
+        if self._prefetch_pool is not None:
+            self._prefetch_pool.shutdown()
+            self._prefetch_pool = None
+        self._bed_mmap.close()
         self._bed_file.close()
 
-    def _read_idx(self, idx: int) -> np.ndarray[Any, np.dtype[np.uint8]]:
+    def _decode(self, chunk: np.ndarray[Any, np.dtype[np.uint8]], out: Optional[np.ndarray[Any, np.dtype[np.uint8]]] = None) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Decode the 4 SNP/Sample of each byte (in the last axis) at once
+        # The output (if provided) must be C contiguous with 4 times the bytes of the chunk in the last axis
+        if _plink_decode is not None:
+            array = np.empty(chunk.shape[:-1] + (chunk.shape[-1] * 4,), dtype=np.uint8) if out is None else out
+            _plink_decode.decode(np.ascontiguousarray(chunk), array)
+            return array
+        if _decode_chunk is not None:
+            array = np.empty(chunk.shape[:-1] + (chunk.shape[-1] * 4,), dtype=np.uint8) if out is None else out
+            # Only big multi-row decodes run in parallel, as a parallel region per read (e.g. from
+            # several threads) is slower for small chunks and aborts with the workqueue threading layer
+            if chunk.ndim > 1 and chunk.size >= _PARALLEL_MIN_BYTES:
+                _decode_chunk_parallel(np.ascontiguousarray(chunk).reshape(-1), array.reshape(-1), _DECODE_WORDS, get_num_threads())
+            else:
+                _decode_chunk(np.ascontiguousarray(chunk).reshape(-1), array.reshape(-1), _DECODE_WORDS)
+            return array
+        # Fall back to the lookup table if neither the C extension nor Numba are available
+        # The gathered array is C contiguous, so merging the last two axes is a view and not a copy
+        if out is None:
+            return np.take(self._LUT, chunk, axis=0).reshape(chunk.shape[:-1] + (chunk.shape[-1] * 4,))
+        # The bytes are always valid rows, clip mode avoids the temporary buffer of the default raise mode
+        np.take(self._LUT, chunk, axis=0, out=out.reshape(chunk.shape + (4,)), mode='clip')
+        return out
+
+    def _decode_rows(self, bit_array: np.ndarray[Any, np.dtype[np.uint8]], out: Optional[np.ndarray[Any, np.dtype[np.uint8]]] = None) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Decode one chunk per row into a C contiguous array without the extra bits
+        array = np.empty((len(bit_array), self._out_len), dtype=np.uint8) if out is None else out
+        if self._out_len == 4 * self.chunk_size_bytes:
+            return self._decode(bit_array, array)
+        # Decode blocks of rows into a padded buffer and copy them without the extra bits
+        rows_per_block = -(-_ITER_BLOCK_BYTES // max(1, self.chunk_size_bytes))
+        buffer = np.empty((min(rows_per_block, len(bit_array)), 4 * self.chunk_size_bytes), dtype=np.uint8)
+        for block_start in range(0, len(bit_array), rows_per_block):
+            block = bit_array[block_start:block_start + rows_per_block]
+            decoded = self._decode(block, buffer[:len(block)])
+            np.copyto(array[block_start:block_start + len(block)], decoded[:, :self._out_len])
+        return array
+
+    def _view_chunk(self, idx: int) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        chunk_offset = self._base_offset + self.chunk_size_bytes * idx
+        if chunk_offset + self.chunk_size_bytes > len(self._bed_mmap):
+            raise ValueError("Unexpected end of BED file")
+        # View the chunk in the memory map as a NumPy array
+        return np.frombuffer(self._bed_mmap, dtype=np.uint8, count=self.chunk_size_bytes, offset=chunk_offset)
+
+    def _check_idx(self, idx: int) -> int:
         # Check if the file is closed
         if self._bed_file.closed:
             raise ValueError("I/O operation on closed BED file")
         # Check if the index is out of bounds
-        if idx >= len(self):
+        if idx < -len(self) or idx >= len(self):
             raise IndexError(f"Index out of bounds {idx} {len(self)}")
+        # Support negative indices as NumPy does
+        return idx + len(self) if idx < 0 else idx
 
-        # Skip the header (first 3 bytes are magic numbers and mode)
-        self._bed_file.seek(3 + self.chunk_size_bytes * (idx + self._offset), os.SEEK_SET)
+    def _read_idx(self, idx: int) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        idx = self._check_idx(idx)
+        # Decode and remove the extra bits, the chunk view is released on return
+        return self._decode(self._view_chunk(idx))[:self._out_len]
+
+    def _read_range(self, start: int, stop: int, out: Optional[np.ndarray[Any, np.dtype[np.uint8]]] = None, advise: bool = True) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Check if the file is closed
+        if self._bed_file.closed:
+            raise ValueError("I/O operation on closed BED file")
+        count = max(stop - start, 0)
 
-        # Read the chunk
-        chunk = self._bed_file.read(self.chunk_size_bytes)
-        if not chunk:
+        chunks_offset = self._base_offset + self.chunk_size_bytes * start
+        chunks_size = self.chunk_size_bytes * count
+        if chunks_offset + chunks_size > len(self._bed_mmap):
             raise ValueError("Unexpected end of BED file")
-        # Convert the chunk to a NumPy array
-        bit_array = np.frombuffer(chunk, dtype=np.uint8)
-        del chunk
-        # The array has one byte per SNP/Sample
-        bit_array = np.unpackbits(bit_array)
-        # The array is stored as two bits per SNP/Sample, but in reverse in each byte, sum them to get the array
-        array = (bit_array[::2] + 2 * bit_array[1::2]).astype(np.uint8)
-        del bit_array
-        # Each block of 4 bit SNP/Sample is stored in reverse order
-        # 0 = homozygous 1/1 (usually minor)
-        # 1 = heterozygous
-        # 2 = missing
-        # 3 = homozygous 2/2 (usually major)
-        # Reverse the order of the SNP/Sample in the block
-        array = array.reshape(-1, 4)[:, ::-1]
-        # Flatten the array
-        array = array.flatten()
-        # Remove the extra bits
-        return array[:self._snp_count] if self._major_mode == BEDMode.INDIVIDUAL_MAJOR else array[:self._sample_count]
+        # Hint the kernel to read the chunks ahead if possible
+        # WILLNEED does not change the flags of the mapping, so it does not split it on each call
+        if advise and hasattr(mmap, 'MADV_WILLNEED') and chunks_size > 0:
+            page_offset = chunks_offset - chunks_offset % mmap.PAGESIZE
+            self._bed_mmap.madvise(mmap.MADV_WILLNEED, page_offset, chunks_offset + chunks_size - page_offset)
+        # Start reading the whole range in the background while the first chunks are decoded
+        # SEQUENTIAL is not used here, on Linux it applies to the whole file and clears the RANDOM advice
+        if advise and hasattr(os, 'posix_fadvise') and chunks_size > 0:
+            os.posix_fadvise(self._bed_file.fileno(), chunks_offset, chunks_size, os.POSIX_FADV_WILLNEED)
+        # View all the contiguous chunks as a NumPy array with one row per chunk
+        bit_array = np.frombuffer(self._bed_mmap, dtype=np.uint8, count=chunks_size, offset=chunks_offset).reshape(count, self.chunk_size_bytes)
+        return self._decode_rows(bit_array, out)
+
+    def _copy_chunk(self, idx: int, buffer: np.ndarray[Any, np.dtype[np.uint8]]):
+        # Copy the chunk out of the memory map, the page faults happen in the calling thread
+        np.copyto(buffer, self._view_chunk(idx))
+
+    def _read_indices_prefetch(self, indices: range) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Check if the file is closed
+        if self._bed_file.closed:
+            raise ValueError("I/O operation on closed BED file")
+        if self._prefetch_pool is None:
+            self._prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        # Each chunk is decoded in order at a stride without the extra bits, overwriting the extra bits of the previous one
+        row_size = self._out_len
+        array = np.empty(len(indices) * row_size + 4 * self.chunk_size_bytes - row_size, dtype=np.uint8)
+        if len(indices) == 0:
+            return array[:0].reshape(0, row_size)
+        # Double buffering, the next chunk is copied while the current one is decoded
+        buffers = np.empty((2, self.chunk_size_bytes), dtype=np.uint8)
+        future = self._prefetch_pool.submit(self._copy_chunk, indices[0], buffers[0])
+        for i in range(len(indices)):
+            future.result()
+            if i + 1 < len(indices):
+                future = self._prefetch_pool.submit(self._copy_chunk, indices[i + 1], buffers[(i + 1) % 2])
+            self._decode(buffers[i % 2], array[i * row_size:i * row_size + 4 * self.chunk_size_bytes])
+        return array[:len(indices) * row_size].reshape(len(indices), row_size)
+
+    def _read_indices_loop(self, indices: range) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Check if the file is closed
+        if self._bed_file.closed:
+            raise ValueError("I/O operation on closed BED file")
+        # Decode each chunk directly into its row of the output
+        # The chunks are decoded in order at a stride without the extra bits, overwriting the extra bits of the previous one
+        row_size = self._out_len
+        array = np.empty(len(indices) * row_size + 4 * self.chunk_size_bytes - row_size, dtype=np.uint8)
+        for row, idx in enumerate(indices):
+            self._decode(self._view_chunk(idx), array[row * row_size:row * row_size + 4 * self.chunk_size_bytes])
+        return array[:len(indices) * row_size].reshape(len(indices), row_size)
+
+    def _read_indices_uring(self, indices: Sequence[int]) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Check if the file is closed
+        if self._bed_file.closed:
+            raise ValueError("I/O operation on closed BED file")
+        fd = self._bed_file.fileno()
+        chunk_size_bytes = self.chunk_size_bytes
+        base_offset = self._base_offset
+        ring = self._uring
+        cqe = self._uring_cqe
+        buffers = self._uring_buffers
+        get_sqe = liburing.io_uring_get_sqe
+        prep_read = liburing.io_uring_prep_read
+        bit_array = np.empty((len(indices), chunk_size_bytes), dtype=np.uint8)
+        # Each in-flight read owns one of the reusable buffers, keep track of the row it belongs to
+        free_slots = list(range(len(buffers)))
+        slot_rows = [0] * len(buffers)
+        submitted = 0
+        completed = 0
+        error = None
+        try:
+            while completed < len(indices):
+                # Queue as many chunk reads as free buffers and the submission queue allow
+                while submitted < len(indices) and free_slots:
+                    sqe = get_sqe(ring)
+                    if not sqe:
+                        break
+                    slot = free_slots.pop()
+                    slot_rows[slot] = submitted
+                    prep_read(sqe, fd, buffers[slot], base_offset + chunk_size_bytes * indices[submitted])
+                    liburing.io_uring_sqe_set_data64(sqe, slot)
+                    submitted += 1
+                liburing.io_uring_submit(ring)
+                # Reap a completed read, all of them must finish before the buffers can be reused
+                liburing.io_uring_wait_cqe(ring, cqe)
+                res = cqe[0].res
+                slot = cqe[0].user_data
+                liburing.io_uring_cq_advance(ring, 1)
+                completed += 1
+                if res < 0:
+                    error = OSError(-res, os.strerror(-res))
+                elif res != chunk_size_bytes:
+                    error = ValueError("Unexpected end of BED file")
+                else:
+                    bit_array[slot_rows[slot]] = np.frombuffer(buffers[slot], dtype=np.uint8)
+                free_slots.append(slot)
+        finally:
+            # Wait for the reads still in flight (e.g. after an interrupt), otherwise their completions would be
+            # reaped by the next call and the kernel could still write into the reused buffers
+            if completed < submitted:
+                liburing.io_uring_submit(ring)
+            while completed < submitted:
+                liburing.io_uring_wait_cqe(ring, cqe)
+                liburing.io_uring_cq_advance(ring, 1)
+                completed += 1
+        if error is not None:
+            raise error
+        return self._decode_rows(bit_array)
+
+    def _read_indices(self, indices: np.ndarray[Any, np.dtype[np.int64]]) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        # Read each distinct index once and in file order
+        unique_indices, inverse = np.unique(indices, return_inverse=True)
+        if self._uring is not None:
+            array = self._read_indices_uring(unique_indices.tolist())
+        else:
+            array = np.empty((len(unique_indices), self._out_len), dtype=np.uint8)
+            # Coalesce each run of adjacent indices into a single read, decoded directly into the output
+            # The runs are not advised one by one, it would cost 3 system calls per run
+            bounds = [0] + (np.flatnonzero(np.diff(unique_indices) != 1) + 1).tolist() + [len(unique_indices)]
+            for run_start, run_stop in zip(bounds[:-1], bounds[1:]):
+                if run_start < run_stop:
+                    self._read_range(int(unique_indices[run_start]), int(unique_indices[run_stop - 1]) + 1, array[run_start:run_stop], advise=False)
+        # Restore the requested order (and repeated indices)
+        if np.array_equal(unique_indices, indices):
+            return array
+        return array[inverse]
+
+    def read_packed(self, idx: int, swap_pairs: bool = True) -> np.ndarray[Any, np.dtype[np.uint8]]:
+        """
+        Reads a SNP (SNP major) or a sample (individual major) without decoding it, with 4 genotypes per byte.
+        This is the fast path for bitwise computations (e.g. allele frequencies), as it moves 4 times less data.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the SNP or sample to read, depending on the major mode.
+        swap_pairs : bool, optional
+            Swap the bits of each pair so ``(byte >> (2 * i)) & 3`` is the i-th genotype with the same encoding
+            as the decoded arrays. If False, the bytes are returned as stored in the BED file.
+
+        Returns
+        -------
+        numpy.ndarray
+            Array (uint8) of ``chunk_size_bytes`` bytes, the pairs of the last byte beyond the number of
+            genotypes are padding.
+        """
+        idx = self._check_idx(idx)
+        bit_array = self._view_chunk(idx)
+        # Always return a copy, a view would keep the memory map from being closed
+        return self._SWAP_PAIRS_LUT[bit_array] if swap_pairs else bit_array.copy()
+
+    def count_per_code(self, idx: int) -> Tuple[int, int, int, int]:
+        """
+        Counts the genotypes of each code of a SNP (SNP major) or a sample (individual major) without decoding it.
+        Useful for allele frequency or missingness computations.
+
+        Parameters
+        ----------
+        idx : int
+            Index of the SNP or sample, depending on the major mode.
+
+        Returns
+        -------
+        tuple of int
+            Number of homozygous 1/1 (code 0), heterozygous (code 1), missing (code 2) and homozygous 2/2 (code 3) genotypes.
+        """
+        # View the chunk in the memory map, it is released on return so it does not keep the map from being closed
+        bit_array = self._view_chunk(self._check_idx(idx))
+        # Histogram of the byte values, counted in small blocks as np.bincount casts them to intp
+        histogram = np.zeros(256, dtype=np.int64)
+        for block_start in range(0, bit_array.size, _COUNT_BLOCK_BYTES):
+            histogram += np.bincount(bit_array[block_start:block_start + _COUNT_BLOCK_BYTES], minlength=256)
+        # Number of each code in each byte value
+        counts = histogram @ self._CODE_COUNTS_LUT
+        # Remove the padding of the last byte
+        if bit_array.size > 0:
+            for code in self._LUT[bit_array[-1], self._out_len - 4 * (self.chunk_size_bytes - 1):]:
+                counts[code] -= 1
+        return int(counts[0]), int(counts[1]), int(counts[2]), int(counts[3])
 
     def __len__(self):
-        return self._sample_count if self._major_mode == BEDMode.INDIVIDUAL_MAJOR else self._snp_count
+        return self._sample_count if self._is_ind_major else self._snp_count
+
+    def __iter__(self) -> Iterator[np.ndarray[Any, np.dtype[np.uint8]]]:
+        """
+        Iterates over all the SNPs (SNP major) or samples (individual major) in a single sequential pass.
+        The file is read and decoded in blocks of contiguous chunks, so full scans avoid a seek per index.
+        """
+        # Check if the file is closed
+        if self._bed_file.closed:
+            raise ValueError("I/O operation on closed BED file")
+        rows_per_block = max(1, _ITER_BLOCK_BYTES // max(1, self.chunk_size_bytes))
+        # The whole mapping is read sequentially, restore the random access advice afterwards
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            self._bed_mmap.madvise(mmap.MADV_SEQUENTIAL)
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self._bed_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        try:
+            for block_start in range(0, len(self), rows_per_block):
+                yield from self._read_range(block_start, min(block_start + rows_per_block, len(self)))
+        finally:
+            if hasattr(mmap, 'MADV_RANDOM') and not self._bed_mmap.closed:
+                self._bed_mmap.madvise(mmap.MADV_RANDOM)
+            if hasattr(os, 'posix_fadvise') and not self._bed_file.closed:
+                os.posix_fadvise(self._bed_file.fileno(), 0, 0, os.POSIX_FADV_RANDOM)
 
-    def __getitem__(self, key: Union[int, slice]):
+    def __getitem__(self, key: Union[int, slice, List[int], np.ndarray[Any, np.dtype[np.integer[Any]]]]):
         if isinstance(key, slice):
-            return np.array([self._read_idx(i) for i in range(*key.indices(len(self)))], dtype=np.uint8)
+            start, stop, step = key.indices(len(self))
+            # Batch all the chunk reads in io_uring submissions if enabled
+            if self._uring is not None:
+                return self._read_indices_uring(range(start, stop, step))
+            # Contiguous slices are read and decoded in a single pass
+            if step == 1:
+                return self._read_range(start, stop)
+            # Overlap the read of the next chunk with the decoding of the current one for big chunks
+            if self.chunk_size_bytes >= _PREFETCH_MIN_BYTES:
+                return self._read_indices_prefetch(range(start, stop, step))
+            return self._read_indices_loop(range(start, stop, step))
+        if isinstance(key, (list, np.ndarray)):
+            indices = np.asarray(key)
+            if indices.size == 0:
+                return np.empty((0, self._out_len), dtype=np.uint8)
+            if indices.ndim != 1 or indices.dtype.kind not in 'iu':
+                raise IndexError("Only one dimensional integer arrays are valid indices")
+            indices = indices.astype(np.int64)
+            # Support negative indices as NumPy does
+            indices[indices < 0] += len(self)
+            if indices.min() < 0 or indices.max() >= len(self):
+                raise IndexError(f"Index out of bounds {key} {len(self)}")
+            return self._read_indices(indices)
         return self._read_idx(key)